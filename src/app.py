@@ -1,6 +1,9 @@
+import argparse
 from functools import partial
+import pathlib
+import sqlite3
 import sys
-from typing import Literal
+from typing import Literal, Optional
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, 
                               QVBoxLayout, QLabel, QStackedWidget,
                               QPushButton, QFrame, QButtonGroup, 
@@ -8,24 +11,58 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget,
 from PySide6.QtCore import Qt, QTimer, QObject, Signal, QThread, Slot
 from PySide6.QtGui import QPixmap
 
-from helpers import extract_all_addons_data, get_addons_folder_windows
+from catalog import AddonCatalog
+from helpers import extract_all_addons_data, get_addons_folder_windows, get_catalog_path_windows
 
 COLOR_1 = '212327'  # Dark background
 COLOR_2 = '904eaf'  # Purple accent
 COLOR_3 = '2d2d43'  # Hover color
 COLOR_4 = '31262e'  # Main background
 
+CATALOG_KEEP_SNAPSHOTS = 30
+
 
 class AddonRepository:
-    def __init__(self):
-        self.addons = extract_all_addons_data(get_addons_folder_windows('live'))
+    def __init__(self, catalog: Optional[AddonCatalog] = None):
+        addons_folder = get_addons_folder_windows('live')
+        self.addons = extract_all_addons_data(addons_folder)
+
+        self.catalog = catalog
+        if self.catalog is not None and addons_folder.exists():
+            try:
+                self.catalog.save_snapshot(self.addons, addons_folder)
+                self.catalog.prune(keep=CATALOG_KEEP_SNAPSHOTS)
+            except sqlite3.Error as e:
+                print(f"Error saving addons catalog: {e}")
 
     def get_addons(self):
         for addon in self.addons:
             yield addon
 
 
-addon_repository = AddonRepository()
+def open_catalog(argv) -> Optional[AddonCatalog]:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--catalog', nargs='?', const='', metavar='PATH',
+        help='save every scan to an SQLite catalog (default location: %%LOCALAPPDATA%%/ESOAddonHelper)',
+    )
+    args, _ = parser.parse_known_args(argv[1:])  # the rest is left to QApplication
+
+    if args.catalog is None:
+        return None
+
+    catalog_path = pathlib.Path(args.catalog) if args.catalog else get_catalog_path_windows()
+
+    # the catalog is optional, a locked or broken database must not keep the app from starting
+    try:
+        catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        return AddonCatalog(catalog_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening addons catalog `{catalog_path}`: {e}")
+        return None
+
+
+addon_repository = AddonRepository(open_catalog(sys.argv))
 
 
 class AddonWorker(QObject):
@@ -0,0 +1,379 @@
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from pprint import pprint
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple, Union, get_origin
+
+from helpers import DEPENDENCY_FIELDS, METADATA_TYPES, extract_all_addons_data, get_addons_folder_windows, get_catalog_path_windows
+
+
+SCAN_COLUMNS = {
+    'manifest_filename': 'TEXT',
+    'manifest_path': 'TEXT',
+    'root_path': 'TEXT',
+    'relative_path': 'TEXT',
+    'bundled': 'BOOLEAN',
+    'ok': 'BOOLEAN',
+}
+
+FTS_COLUMNS = ('title', 'author', 'description')
+
+
+SQL_TYPES = {
+    str: 'TEXT',
+    int: 'INTEGER',
+    bool: 'BOOLEAN',
+}
+
+
+def metadata_columns() -> Dict[str, str]:
+    return {key: SQL_TYPES[type_] for key, type_ in METADATA_TYPES.items() if get_origin(type_) is not list}
+
+
+def metadata_list_fields() -> List[str]:
+    return [key for key, type_ in METADATA_TYPES.items() if get_origin(type_) is list]
+
+
+def split_dependency(dependency: str) -> Tuple[str, Optional[int]]:
+    # DependsOn entries may carry a minimal version, e.g. `LibAddonMenu-2.0>=32`
+    match = re.match(r'^(.*?)>=(\d+)$', dependency)
+    if not match:
+        return dependency, None
+
+    return match.group(1), int(match.group(2))
+
+
+class AddonCatalog:
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+
+        self.columns = {**SCAN_COLUMNS, **metadata_columns()}
+        self.list_fields = metadata_list_fields()
+
+        try:
+            self.create_schema()
+        except sqlite3.Error:
+            self.connection.close()
+            raise
+
+    def create_schema(self):
+        columns = ',\n'.join(f'"{name}" {type_}' for name, type_ in self.columns.items())
+        fts_columns = ', '.join(FTS_COLUMNS)
+
+        with self.connection:
+            self.connection.executescript(f"""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    id INTEGER PRIMARY KEY,
+                    taken_at TEXT NOT NULL,
+                    addons_path TEXT
+                );
+                CREATE INDEX IF NOT EXISTS snapshots_taken_at ON snapshots (taken_at);
+
+                CREATE TABLE IF NOT EXISTS addons (
+                    id INTEGER PRIMARY KEY,
+                    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+                    content_hash TEXT,
+                    {columns}
+                );
+                CREATE INDEX IF NOT EXISTS addons_snapshot_path ON addons (snapshot_id, manifest_path);
+
+                CREATE TABLE IF NOT EXISTS addon_values (
+                    addon_id INTEGER NOT NULL REFERENCES addons (id) ON DELETE CASCADE,
+                    field TEXT NOT NULL,
+                    value,
+                    version INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS addon_values_lookup ON addon_values (field, value, addon_id);
+                CREATE INDEX IF NOT EXISTS addon_values_addon ON addon_values (addon_id);
+
+                CREATE TABLE IF NOT EXISTS addon_errors (
+                    addon_id INTEGER NOT NULL REFERENCES addons (id) ON DELETE CASCADE,
+                    message TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS addon_errors_addon ON addon_errors (addon_id);
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS addons_fts USING fts5 (
+                    {fts_columns}, content='addons', content_rowid='id'
+                );
+            """)
+
+            # catalogs created before a field was added to METADATA_FIELDS lack its column
+            existing = {row['name'] for row in self.connection.execute('PRAGMA table_info(addons)')}
+            for name, type_ in self.columns.items():
+                if name not in existing:
+                    self.connection.execute(f'ALTER TABLE addons ADD COLUMN "{name}" {type_}')
+
+    def close(self):
+        self.connection.close()
+
+    def save_snapshot(self, addons: List[dict], addons_path: Optional[str] = None) -> Optional[int]:
+        # an empty scan of a missing folder would show every addon as removed, and then added again
+        if addons_path is not None and not os.path.exists(addons_path):
+            print('path does not exists, snapshot is not saved')
+            return None
+
+        taken_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+        names = ', '.join(f'"{name}"' for name in self.columns)
+        placeholders = ', '.join('?' for _ in self.columns)
+        insert_addon = f'INSERT INTO addons (snapshot_id, content_hash, {names}) VALUES (?, ?, {placeholders})'
+
+        hashes = [self.content_hash(addon) for addon in addons]
+
+        # a rescan of an untouched AddOns folder would only duplicate the latest snapshot
+        latest = self.latest_snapshot()
+        if latest is not None:
+            previous = self.connection.execute(
+                'SELECT manifest_path, content_hash FROM addons WHERE snapshot_id = ?', (latest,)
+            ).fetchall()
+            current = [(self.to_sql(addon.get('manifest_path')), hash_) for addon, hash_ in zip(addons, hashes)]
+            if sorted(map(tuple, previous)) == sorted(current):
+                return latest
+
+        values = []
+        errors = []
+        fts_rows = []
+
+        with self.connection:
+            snapshot_id = self.connection.execute(
+                'INSERT INTO snapshots (taken_at, addons_path) VALUES (?, ?)',
+                (taken_at, str(addons_path) if addons_path is not None else None),
+            ).lastrowid
+
+            for addon, hash_ in zip(addons, hashes):
+                row = [self.to_sql(addon.get(name)) for name in self.columns]
+                addon_id = self.connection.execute(
+                    insert_addon, (snapshot_id, hash_, *row)
+                ).lastrowid
+
+                for field in self.list_fields:
+                    for value in addon.get(field, []):
+                        version = None
+                        if field in DEPENDENCY_FIELDS:
+                            value, version = split_dependency(value)
+                        values.append((addon_id, field, value, version))
+                errors.extend((addon_id, message) for message in addon.get('errors', []))
+                fts_rows.append((addon_id, *(addon.get(name) for name in FTS_COLUMNS)))
+
+            self.connection.executemany('INSERT INTO addon_values VALUES (?, ?, ?, ?)', values)
+            self.connection.executemany('INSERT INTO addon_errors VALUES (?, ?)', errors)
+            self.connection.executemany(
+                f'INSERT INTO addons_fts (rowid, {", ".join(FTS_COLUMNS)}) VALUES (?, ?, ?, ?)',
+                fts_rows,
+            )
+
+        return snapshot_id
+
+    def delete_snapshot(self, snapshot_id: int):
+        with self.connection:
+            self.delete_snapshots([snapshot_id])
+
+    def prune(self, keep: int):
+        with self.connection:
+            rows = self.connection.execute(
+                'SELECT id FROM snapshots ORDER BY taken_at DESC, id DESC LIMIT -1 OFFSET ?', (keep,)
+            ).fetchall()
+            self.delete_snapshots([row['id'] for row in rows])
+
+    def delete_snapshots(self, snapshot_ids: List[int]):
+        # addons_fts is an external-content table, the cascade from snapshots does not reach it
+        fts_columns = ', '.join(FTS_COLUMNS)
+        for snapshot_id in snapshot_ids:
+            self.connection.execute(f"""
+                INSERT INTO addons_fts (addons_fts, rowid, {fts_columns})
+                SELECT 'delete', id, {fts_columns} FROM addons WHERE snapshot_id = ?
+            """, (snapshot_id,))
+            self.connection.execute('DELETE FROM snapshots WHERE id = ?', (snapshot_id,))
+
+    def content_hash(self, addon: dict) -> str:
+        # covers everything stored for an addon, so any change in its manifest or checks changes the hash
+        content = {name: self.to_sql(addon.get(name)) for name in self.columns}
+        content.update({field: addon.get(field, []) for field in self.list_fields})
+        content['errors'] = addon.get('errors', [])
+
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def to_sql(value):
+        if isinstance(value, os.PathLike):
+            return os.fspath(value)
+        return value
+
+    def latest_snapshot(self) -> Optional[int]:
+        row = self.connection.execute('SELECT id FROM snapshots ORDER BY taken_at DESC, id DESC LIMIT 1').fetchone()
+        return row['id'] if row else None
+
+    def snapshot_at(self, moment: datetime) -> Optional[int]:
+        row = self.connection.execute(
+            'SELECT id FROM snapshots WHERE taken_at <= ? ORDER BY taken_at DESC, id DESC LIMIT 1',
+            (self.to_timestamp(moment),),
+        ).fetchone()
+        return row['id'] if row else None
+
+    def first_snapshot_after(self, moment: datetime) -> Optional[int]:
+        row = self.connection.execute(
+            'SELECT id FROM snapshots WHERE taken_at > ? ORDER BY taken_at, id LIMIT 1',
+            (self.to_timestamp(moment),),
+        ).fetchone()
+        return row['id'] if row else None
+
+    @staticmethod
+    def to_timestamp(moment: datetime) -> str:
+        return moment.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+    def get_snapshots(self) -> List[dict]:
+        rows = self.connection.execute("""
+            SELECT snapshots.*, COUNT(addons.id) AS addons_count
+            FROM snapshots LEFT JOIN addons ON addons.snapshot_id = snapshots.id
+            GROUP BY snapshots.id
+            ORDER BY taken_at
+        """)
+        return [dict(row) for row in rows]
+
+    def get_addons(self, snapshot_id: Optional[int] = None):
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+
+        rows = self.connection.execute('SELECT * FROM addons WHERE snapshot_id = ? ORDER BY id', (snapshot_id,))
+        for row in rows.fetchall():
+            yield self.load_addon(row)
+
+    def load_addon(self, row: sqlite3.Row) -> dict:
+        addon = {key: row[key] for key in self.columns if row[key] is not None}
+        for key, type_ in self.columns.items():
+            if key in addon and type_ == 'BOOLEAN':
+                addon[key] = bool(addon[key])
+
+        for value_row in self.connection.execute(
+            'SELECT field, value, version FROM addon_values WHERE addon_id = ? ORDER BY rowid', (row['id'],)
+        ):
+            value = value_row['value']
+            if value_row['version'] is not None:
+                value = f"{value}>={value_row['version']}"
+            addon.setdefault(value_row['field'], []).append(value)
+
+        addon['errors'] = [
+            error_row['message'] for error_row in self.connection.execute(
+                'SELECT message FROM addon_errors WHERE addon_id = ? ORDER BY rowid', (row['id'],)
+            )
+        ]
+
+        return addon
+
+    def search(self, text: str, snapshot_id: Optional[int] = None) -> List[dict]:
+        # every word is matched literally, so `LibAddonMenu-2.0` or `Foo: bar` are not read as FTS5 syntax
+        query = ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+        if not query:
+            return []
+
+        return self.search_raw(query, snapshot_id)
+
+    def search_raw(self, query: str, snapshot_id: Optional[int] = None) -> List[dict]:
+        # `query` is FTS5 syntax (`title:lib*`, `NOT`, `NEAR(...)`), malformed queries raise ValueError
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+
+        try:
+            rows = self.connection.execute("""
+                SELECT addons.* FROM addons_fts
+                JOIN addons ON addons.id = addons_fts.rowid
+                WHERE addons_fts MATCH ? AND addons.snapshot_id = ?
+                ORDER BY addons_fts.rank
+            """, (query, snapshot_id)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f'Bad search query `{query}`: {e}') from e
+
+        return [self.load_addon(row) for row in rows]
+
+    def find_by_value(self, field: str, value, snapshot_id: Optional[int] = None) -> List[dict]:
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+
+        rows = self.connection.execute("""
+            SELECT DISTINCT addons.* FROM addon_values
+            JOIN addons ON addons.id = addon_values.addon_id
+            WHERE addon_values.field = ? AND addon_values.value = ? AND addons.snapshot_id = ?
+            ORDER BY addons.id
+        """, (field, value, snapshot_id)).fetchall()
+
+        return [self.load_addon(row) for row in rows]
+
+    def addons_with_api(self, api_version: int, snapshot_id: Optional[int] = None) -> List[dict]:
+        return self.find_by_value('api', api_version, snapshot_id)
+
+    def dependents_of(self, addon_name: str, snapshot_id: Optional[int] = None) -> List[dict]:
+        if snapshot_id is None:
+            snapshot_id = self.latest_snapshot()
+
+        fields = ', '.join('?' for _ in DEPENDENCY_FIELDS)
+        rows = self.connection.execute(f"""
+            SELECT DISTINCT addons.* FROM addon_values
+            JOIN addons ON addons.id = addon_values.addon_id
+            WHERE addon_values.field IN ({fields}) AND addon_values.value = ? AND addons.snapshot_id = ?
+            ORDER BY addons.id
+        """, (*DEPENDENCY_FIELDS, addon_name, snapshot_id)).fetchall()
+
+        return [self.load_addon(row) for row in rows]
+
+    def changes_between(self, old_snapshot_id: int, new_snapshot_id: int) -> Dict[str, List[dict]]:
+        added = self.connection.execute("""
+            SELECT new.* FROM addons AS new
+            WHERE new.snapshot_id = ? AND NOT EXISTS (
+                SELECT 1 FROM addons AS old
+                WHERE old.snapshot_id = ? AND old.manifest_path = new.manifest_path
+            )
+            ORDER BY new.id
+        """, (new_snapshot_id, old_snapshot_id)).fetchall()
+
+        removed = self.connection.execute("""
+            SELECT old.* FROM addons AS old
+            WHERE old.snapshot_id = ? AND NOT EXISTS (
+                SELECT 1 FROM addons AS new
+                WHERE new.snapshot_id = ? AND new.manifest_path = old.manifest_path
+            )
+            ORDER BY old.id
+        """, (old_snapshot_id, new_snapshot_id)).fetchall()
+
+        updated = self.connection.execute("""
+            SELECT new.* FROM addons AS new
+            JOIN addons AS old ON old.manifest_path = new.manifest_path
+            WHERE new.snapshot_id = ? AND old.snapshot_id = ?
+              AND new.content_hash IS NOT old.content_hash
+            ORDER BY new.id
+        """, (new_snapshot_id, old_snapshot_id)).fetchall()
+
+        return {
+            'added': [self.load_addon(row) for row in added],
+            'removed': [self.load_addon(row) for row in removed],
+            'updated': [self.load_addon(row) for row in updated],
+        }
+
+    def changes_since(self, moment: datetime) -> Dict[str, List[dict]]:
+        # with no snapshot as old as `moment`, the history starts at the first snapshot taken after it
+        latest = self.latest_snapshot()
+        if latest is None:
+            raise LookupError('Catalog has no snapshots')
+
+        baseline = self.snapshot_at(moment)
+        if baseline is None:
+            baseline = self.first_snapshot_after(moment)
+
+        return self.changes_between(baseline, latest)
+
+
+if __name__ == '__main__':
+    folder_live = get_addons_folder_windows('live')
+
+    catalog_path = get_catalog_path_windows()
+    catalog_path.parent.mkdir(parents=True, exist_ok=True)
+
+    catalog = AddonCatalog(catalog_path)
+    catalog.save_snapshot(extract_all_addons_data(folder_live), folder_live)
+
+    pprint(catalog.get_snapshots())
+    pprint([addon['title'] for addon in catalog.addons_with_api(101044)])
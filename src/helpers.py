@@ -7,6 +7,7 @@ import ctypes.wintypes
 import pathlib
 from typing import Literal
 CSIDL_PERSONAL = 5
+CSIDL_LOCAL_APPDATA = 28
 SHGFP_TYPE_CURRENT = 0 
 
 
@@ -19,6 +20,13 @@ def get_addons_folder_windows(version: Literal['live', 'pts']):
     return addons_folder
 
 
+def get_catalog_path_windows() -> pathlib.Path:
+    buf = ctypes.create_unicode_buffer(ctypes.wintypes.MAX_PATH)
+    ctypes.windll.shell32.SHGetFolderPathW(None, CSIDL_LOCAL_APPDATA, None, SHGFP_TYPE_CURRENT, buf)
+
+    return pathlib.Path(buf.value).resolve() / 'ESOAddonHelper/addons.sqlite3'
+
+
 def extract_all_addons_data(addons_path: str) -> List[Dict[str, Union[str, bool]]]:
     addons = []
     
@@ -91,6 +99,25 @@ METADATA_FIELDS = {
     'IntVersion': lambda x: {'intVersion': int(x)},
 }
 
+# types of the keys set by METADATA_FIELDS, keep in sync when adding a field
+METADATA_TYPES = {
+    'title': str,
+    'version': str,
+    'description': str,
+    'api': List[int],
+    'author': str,
+    'addonVersion': str,
+    'dependsOn': List[str],
+    'pcDependsOn': List[str],
+    'consoleDependsOn': List[str],
+    'optionalDependsOn': List[str],
+    'savedVariables': List[str],
+    'isLibrary': bool,
+    'intVersion': int,
+}
+
+DEPENDENCY_FIELDS = ('dependsOn', 'pcDependsOn', 'consoleDependsOn', 'optionalDependsOn')
+
 
 def handle_metadata_line(addon_data: dict, line: str) -> None:
     match = re.match(r'^\s*##\s*(\w*):\s*(.*)', line)
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+from typing import get_origin
+
+import pytest
+
+from catalog import SQL_TYPES, AddonCatalog
+from helpers import METADATA_FIELDS, METADATA_TYPES, extract_all_addons_data
+
+
+def write_manifest(addons_path, name, *lines):
+    folder = addons_path / name
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / f'{name}.txt').write_text('\n'.join([f'## Title: {name}', *lines]) + '\n', encoding='utf-8')
+
+
+@pytest.fixture
+def addons_path(tmp_path):
+    path = tmp_path / 'AddOns'
+    write_manifest(path, 'Foo', '## Author: |cff0000Me|r', '## APIVersion: 101044 101045', '## DependsOn: LibAddonMenu-2.0>=32')
+    write_manifest(path, 'Bar', '## APIVersion: 101043', '## OptionalDependsOn: LibAddonMenu-2.0')
+    write_manifest(path, 'LibAddonMenu-2.0', '## IsLibrary: true', '## Description: Settings: menus. And more')
+    return path.resolve()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AddonCatalog(tmp_path / 'catalog.sqlite3')
+    yield catalog
+    catalog.close()
+
+
+def scan(catalog, addons_path):
+    return catalog.save_snapshot(extract_all_addons_data(addons_path), addons_path)
+
+
+def titles(addons):
+    return sorted(addon['title'] for addon in addons)
+
+
+def test_save_snapshot_round_trip(catalog, addons_path):
+    scan(catalog, addons_path)
+
+    addons = {addon['title']: addon for addon in catalog.get_addons()}
+
+    assert addons['Foo']['author'] == 'Me'
+    assert addons['Foo']['api'] == [101044, 101045]
+    assert addons['Foo']['dependsOn'] == ['LibAddonMenu-2.0>=32']
+    assert addons['LibAddonMenu-2.0']['isLibrary'] is True
+    assert addons['Bar']['ok'] is True
+
+
+def test_metadata_types_cover_metadata_fields(catalog, tmp_path):
+    # a key missing from METADATA_TYPES would be silently left out of the catalog
+    path = tmp_path / 'AddOns'
+    write_manifest(path, 'Everything', *(f'## {field}: 1' for field in METADATA_FIELDS if field != 'Title'))
+    scan(catalog, path)
+
+    [addon] = extract_all_addons_data(path)
+    [stored] = catalog.get_addons()
+
+    metadata_keys = set(addon) - {'manifest_filename', 'manifest_path', 'root_path', 'relative_path', 'bundled', 'errors', 'ok'}
+    assert addon['errors'] == []
+    assert metadata_keys == set(METADATA_TYPES)
+    assert metadata_keys <= set(stored)
+    assert all(type_ in SQL_TYPES for type_ in METADATA_TYPES.values() if get_origin(type_) is not list)
+
+
+def test_save_snapshot_skips_unchanged_scan(catalog, addons_path):
+    first = scan(catalog, addons_path)
+
+    assert scan(catalog, addons_path) == first
+    assert len(catalog.get_snapshots()) == 1
+
+
+def test_save_snapshot_skips_missing_folder(catalog, addons_path, tmp_path):
+    scan(catalog, addons_path)
+
+    assert scan(catalog, tmp_path / 'Missing') is None
+    assert len(catalog.get_snapshots()) == 1
+
+
+def test_addons_with_api(catalog, addons_path):
+    scan(catalog, addons_path)
+
+    assert titles(catalog.addons_with_api(101044)) == ['Foo']
+    assert titles(catalog.addons_with_api(101043)) == ['Bar']
+    assert catalog.addons_with_api(100000) == []
+
+
+def test_dependents_of_matches_plain_and_versioned_entries(catalog, addons_path):
+    scan(catalog, addons_path)
+
+    assert titles(catalog.dependents_of('LibAddonMenu-2.0')) == ['Bar', 'Foo']
+    assert catalog.dependents_of('LibAddonMenu') == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('LibAddonMenu-2.0', ['LibAddonMenu-2.0']),
+    ('menus.', ['LibAddonMenu-2.0']),
+    ('Settings:', ['LibAddonMenu-2.0']),
+    ('AND', ['LibAddonMenu-2.0']),
+    ('a.b', []),
+    ("it's", []),
+    ('Foo: bar', []),
+    ('"', []),
+    ('NEAR(', []),
+])
+def test_search_accepts_punctuation(catalog, addons_path, text, expected):
+    scan(catalog, addons_path)
+
+    assert titles(catalog.search(text)) == expected
+
+
+def test_search(catalog, addons_path):
+    scan(catalog, addons_path)
+
+    assert titles(catalog.search('LibAddonMenu-2.0')) == ['LibAddonMenu-2.0']
+    assert titles(catalog.search('settings: and')) == ['LibAddonMenu-2.0']
+    assert titles(catalog.search('me')) == ['Foo']
+    assert catalog.search('   ') == []
+
+
+def test_search_raw_rejects_bad_syntax(catalog, addons_path):
+    scan(catalog, addons_path)
+
+    assert titles(catalog.search_raw('title:fo*')) == ['Foo']
+    with pytest.raises(ValueError):
+        catalog.search_raw('Foo: bar')
+
+
+def test_changes_between(catalog, addons_path):
+    first = scan(catalog, addons_path)
+
+    write_manifest(addons_path, 'Bar', '## APIVersion: 101044', '## OptionalDependsOn: LibAddonMenu-2.0')
+    write_manifest(addons_path, 'Baz')
+    (addons_path / 'Foo' / 'Foo.txt').unlink()
+    second = scan(catalog, addons_path)
+
+    changes = catalog.changes_between(first, second)
+
+    assert titles(changes['added']) == ['Baz']
+    assert titles(changes['removed']) == ['Foo']
+    assert titles(changes['updated']) == ['Bar']
+
+
+def test_changes_since_without_older_snapshot(catalog, addons_path):
+    with pytest.raises(LookupError):
+        catalog.changes_since(datetime.now())
+
+    scan(catalog, addons_path)
+    write_manifest(addons_path, 'Baz')
+    scan(catalog, addons_path)
+
+    changes = catalog.changes_since(datetime.now() - timedelta(days=7))
+
+    assert titles(changes['added']) == ['Baz']
+    assert changes['removed'] == changes['updated'] == []
+
+
+def test_prune_keeps_search_index_in_sync(catalog, addons_path):
+    scan(catalog, addons_path)
+    write_manifest(addons_path, 'Baz')
+    latest = scan(catalog, addons_path)
+
+    catalog.prune(keep=1)
+
+    assert [snapshot['id'] for snapshot in catalog.get_snapshots()] == [latest]
+    assert titles(catalog.search('Foo')) == ['Foo']
+    catalog.connection.execute("INSERT INTO addons_fts (addons_fts, rank) VALUES ('integrity-check', 1)")
+    count = catalog.connection.execute("SELECT COUNT(*) FROM addons_fts WHERE addons_fts MATCH 'Foo'").fetchone()[0]
+    assert count == 1